@@ -1,31 +1,113 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-import sqlite3, json, os
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g, stream_template, jsonify, get_flashed_messages
+import sqlite3, os, sys, math, queue, threading, time, atexit
 from datetime import datetime
+from functools import lru_cache
+from itertools import product
 from werkzeug.security import generate_password_hash, check_password_hash
 
+try:
+    from numba import njit
+except ImportError:  # listed in requirements; without it the scorers run as plain Python
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
 # ----------------------------------------------------
 # App setup
 # ----------------------------------------------------
 app = Flask(__name__)
 app.secret_key = "change_this_in_production_please"  # ⚠️ change for real use
 DB_PATH = "database.db"
+# Password hash method/cost, e.g. "scrypt:32768:8:1" (n:r:p) or "pbkdf2:sha256:600000";
+# retune here. Existing hashes keep verifying with the method stored in them.
+PW_METHOD = "scrypt"
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE = sys.maxsize // HISTORY_PAGE_SIZE
+# Form inputs stored as typed history columns (replaces the old inputs_json blob)
+INPUT_COLUMNS = (
+    ("gender", "TEXT"), ("age", "INTEGER"), ("height_cm", "REAL"), ("weight_kg", "REAL"),
+    ("bmi", "REAL"), ("systolic", "INTEGER"), ("diastolic", "INTEGER"),
+    ("fasting_glucose", "INTEGER"), ("cholesterol", "INTEGER"),
+    ("smoker", "INTEGER"), ("activity", "TEXT"), ("fam_diabetes", "INTEGER"),
+)
+INPUT_NAMES = tuple(name for name, _ in INPUT_COLUMNS)
+# Background history writer: commit up to this many rows, waiting at most this long
+HISTORY_BATCH = 32
+HISTORY_FLUSH_SECS = 0.05
+# Retries for transient write errors (e.g. locked by another worker), with doubling backoff
+HISTORY_WRITE_ATTEMPTS = 5
+HISTORY_RETRY_SECS = 0.05
 
 # ----------------------------------------------------
 # DB helpers & bootstrap/migration
 # ----------------------------------------------------
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+# Bump when init_db() gains new tables/columns; stored in PRAGMA user_version
+SCHEMA_VERSION = 2
+
+# Per-connection tuning; journal_mode=WAL is persistent and set once in init_db()
+CONN_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-20000;
+"""
+
+# Hot-path statements, built once so sqlite3's per-connection statement
+# cache always sees the same text and skips re-parsing
+STATEMENT_CACHE_SIZE = 256
+INSERT_USER_SQL = "INSERT OR IGNORE INTO users(username, password_hash) VALUES(?, ?)"
+SELECT_USER_SQL = "SELECT id, username, password_hash FROM users WHERE username=?"
+TABLE_COLUMNS_SQL = "SELECT name FROM pragma_table_info(?)"
+INSERT_HISTORY_SQL = f"""
+    INSERT INTO history(user_id, {", ".join(INPUT_NAMES)},
+                        diabetes_risk, hypertension_risk, heart_risk, narrative)
+    VALUES(?, {", ".join("?" * len(INPUT_NAMES))}, ?, ?, ?, ?)
+"""
+SELECT_HISTORY_PAGE_SQL = f"""
+    SELECT id, {", ".join(INPUT_NAMES)},
+           diabetes_risk, hypertension_risk, heart_risk, created_at, narrative
+    FROM history
+    WHERE user_id=?
+    ORDER BY created_at DESC, id DESC
+    LIMIT ? OFFSET ?
+"""
+
+def connect_db():
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
+    conn.executescript(CONN_PRAGMAS)
     return conn
 
-def column_exists(cursor, table, column):
-    cursor.execute(f"PRAGMA table_info({table});")
-    cols = [r["name"] for r in cursor.fetchall()]
-    return column in cols
+def get_db():
+    # One connection per request/app context, closed in close_db()
+    db = getattr(g, "_db", None)
+    if db is None:
+        db = g._db = connect_db()
+    return db
+
+@app.teardown_appcontext
+def close_db(exc):
+    db = g.pop("_db", None)
+    if db is not None:
+        db.close()
+
+def table_columns(conn, table):
+    return frozenset(r["name"] for r in conn.execute(TABLE_COLUMNS_SQL, (table,)))
 
 def init_db():
-    with get_db() as conn:
+    conn = connect_db()
+    try:
         c = conn.cursor()
+        # Schema already current: nothing to create or migrate
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        # WAL lets readers proceed while a writer commits
+        c.execute("PRAGMA journal_mode=WAL")
+
+        # Create/migrate atomically; IMMEDIATE serialises workers booting together
+        c.execute("BEGIN IMMEDIATE")
 
         # users
         c.execute("""
@@ -43,6 +125,18 @@ def init_db():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             inputs_json TEXT,
+            gender TEXT,
+            age INTEGER,
+            height_cm REAL,
+            weight_kg REAL,
+            bmi REAL,
+            systolic INTEGER,
+            diastolic INTEGER,
+            fasting_glucose INTEGER,
+            cholesterol INTEGER,
+            smoker INTEGER,
+            activity TEXT,
+            fam_diabetes INTEGER,
             diabetes_risk TEXT,
             hypertension_risk TEXT,
             heart_risk TEXT,
@@ -51,10 +145,18 @@ def init_db():
             FOREIGN KEY(user_id) REFERENCES users(id)
           )
         """)
+        # /history filters by user and sorts newest first, breaking same-second
+        # ties by id; scanned backwards, this index (rowid is its implicit last
+        # column) yields created_at DESC, id DESC without a sort. It replaces
+        # the created_at DESC index from schema version 1.
+        c.execute("DROP INDEX IF EXISTS ix_history_user_created")
+        c.execute("""
+          CREATE INDEX IF NOT EXISTS ix_history_user_created_id
+          ON history(user_id, created_at)
+        """)
 
-        # safety migration: ensure columns exist (if DB created by old code)
-        c.execute("PRAGMA table_info(history)")
-        cols = [row["name"] for row in c.fetchall()]
+        # safety migration: ensure columns exist (if DB created by old code, user_version 0)
+        cols = table_columns(conn, "history")
 
         if "inputs_json" not in cols:
             c.execute("ALTER TABLE history ADD COLUMN inputs_json TEXT")
@@ -67,170 +169,367 @@ def init_db():
         if "narrative" not in cols:
             c.execute("ALTER TABLE history ADD COLUMN narrative TEXT")
 
-        conn.commit()
+        # typed input columns; backfill them once from inputs_json for old rows
+        missing = [(name, typ) for name, typ in INPUT_COLUMNS if name not in cols]
+        for name, typ in missing:
+            c.execute(f"ALTER TABLE history ADD COLUMN {name} {typ}")
+        if missing:
+            c.execute("UPDATE history SET " + ", ".join(
+                f"{name} = json_extract(inputs_json, '$.{name}')" for name, _ in missing
+            ) + " WHERE json_valid(inputs_json)")
+
+        c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        c.execute("COMMIT")
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
 
 init_db()
 
+# ----------------------------------------------------
+# Background history writer
+# ----------------------------------------------------
+history_q = queue.Queue()
+
+def _history_writer():
+    conn = connect_db()
+    running = True
+    while running:
+        rows = [history_q.get()]
+        deadline = time.monotonic() + HISTORY_FLUSH_SECS
+        while len(rows) < HISTORY_BATCH:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                rows.append(history_q.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        # None is the shutdown sentinel; flush what we have and stop
+        if None in rows:
+            running = False
+            rows = [r for r in rows if r is not None]
+        if not rows:
+            continue
+
+        _save_history_batch(conn, rows)
+    conn.close()
+
+def _is_lock_error(exc):
+    # sqlite_errorname is Python 3.11+; older versions only have the message
+    # ("database is locked" / "database table is locked")
+    name = getattr(exc, "sqlite_errorname", None)
+    return name in ("SQLITE_BUSY", "SQLITE_LOCKED") or (name is None and "locked" in str(exc))
+
+def _save_history_batch(conn, rows):
+    for attempt in range(HISTORY_WRITE_ATTEMPTS):
+        try:
+            # One write transaction (and one WAL commit) for the whole batch
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(INSERT_HISTORY_SQL, rows)
+            conn.execute("COMMIT")
+            return
+        except Exception as exc:
+            _rollback(conn)
+            if not (isinstance(exc, sqlite3.OperationalError) and _is_lock_error(exc)):
+                error = exc
+                break
+            # Transient: another worker holds the write lock
+            if attempt + 1 < HISTORY_WRITE_ATTEMPTS:
+                time.sleep(HISTORY_RETRY_SECS * 2 ** attempt)
+                continue
+            app.logger.exception("Gave up saving %d history rows after %d attempts",
+                                 len(rows), HISTORY_WRITE_ATTEMPTS)
+            return
+
+    # Not transient (bad row, schema mismatch, ...): retrying the batch won't
+    # help, so save rows one by one and only drop the ones that fail
+    if len(rows) > 1:
+        for row in rows:
+            _save_history_batch(conn, [row])
+    else:
+        app.logger.error("Failed to save history row", exc_info=error)
+
+def _rollback(conn):
+    try:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+    except sqlite3.Error:
+        pass
+
+history_writer = threading.Thread(target=_history_writer, name="history-writer", daemon=True)
+history_writer.start()
+
+@atexit.register
+def _stop_history_writer():
+    history_q.put(None)
+    history_writer.join(timeout=5)
+
 # ----------------------------------------------------
 # Utility & safety parsers (no external libs)
 # ----------------------------------------------------
+INT64_MIN, INT64_MAX = -2**63, 2**63 - 1
+
 def s_float(v, d=0.0):
+    if not v:  # missing/empty field: skip the exception path
+        return d
     try:
-        return float(v)
-    except:
+        f = float(v)
+    except (TypeError, ValueError):
         return d
+    # "nan"/"inf" parse fine but aren't usable numbers (and aren't valid JSON)
+    return f if math.isfinite(f) else d
 
 def s_int(v, d=0):
+    if not v:
+        return d
+    if isinstance(v, str):
+        v = v.strip()
     try:
-        return int(float(v))
-    except:
+        # plain digits parse directly; anything else ("42.5", "1e2") goes via float
+        n = int(v) if isinstance(v, str) and v.isdecimal() else int(float(v))
+    except (TypeError, ValueError, OverflowError):
         return d
+    # Keep within int64 for the njit scorers and SQLite INTEGER columns
+    return min(max(n, INT64_MIN), INT64_MAX)
 
+@lru_cache(maxsize=1024)
 def compute_bmi(height_cm, weight_kg):
     h_m = height_cm / 100.0 if height_cm else 0
     if h_m <= 0:
         return 0.0
-    return round(weight_kg / (h_m*h_m), 1)
+    bmi = round(weight_kg / (h_m*h_m), 1)
+    return bmi if math.isfinite(bmi) else 0.0
 
 # ----------------------------------------------------
 # Risk scorers (rule-based “AI-ish”)
 # ----------------------------------------------------
-def score_diabetes(age, bmi, fasting_glucose, activity, fam_diabetes):
-    score, reasons = 0, []
-
+# _score_core only does integer/float compares and returns a
+# (score, fired) pair per condition, where bit i of `fired` marks rule i
+# as triggered; reason strings are looked up from the *_REASONS tuples.
+CATEGORIES = ("Low", "Moderate", "High")
+ACTIVITY_CODES = {"low": 0, "medium": 1, "high": 2}
+GENDER_CODES = {"male": 0, "female": 1}
+
+DIABETES_REASONS = (
+    "Age ≥ 45 (+2)",
+    "BMI ≥ 30 (+3)",
+    "BMI 25–29.9 (+1)",
+    "Fasting glucose ≥ 126 mg/dL (+5)",
+    "Fasting glucose 100–125 mg/dL (+3)",
+    "Low activity (+2)",
+    "Moderate activity (+1)",
+    "Family history of diabetes (+2)",
+)
+HYPERTENSION_REASONS = (
+    "Stage 2 BP (≥160/≥100) (+5)",
+    "Stage 1 BP (≥140/≥90) (+3)",
+    "Elevated BP (≥130/≥80) (+2)",
+    "Age ≥ 55 (+2)",
+    "BMI ≥ 30 (+2)",
+    "BMI 25–29.9 (+1)",
+    "Smoker (+2)",
+)
+HEART_REASONS = (
+    "Age threshold (+2)",
+    "Total cholesterol ≥ 240 (+3)",
+    "Total cholesterol 200–239 (+2)",
+    "Smoker (+2)",
+    "High diabetes risk (+2)",
+    "Moderate diabetes risk (+1)",
+    "Systolic BP ≥ 140 (+2)",
+    "Systolic BP 130–139 (+1)",
+)
+
+@njit(cache=True)
+def _category_code(score):
+    return 2 if score >= 7 else 1 if score >= 4 else 0
+
+@njit(cache=True)
+def _score_core(gender_code, age, bmi, systolic, diastolic, fasting_glucose,
+                cholesterol, smoker, activity_code, fam_diabetes):
+    # Tiers shared by several scorers are evaluated once
+    bmi_tier = 2 if bmi >= 30 else 1 if bmi >= 25 else 0
+    sys_tier = 2 if systolic >= 140 else 1 if systolic >= 130 else 0
+
+    # Diabetes
+    d_score, d_fired = 0, 0
     if age >= 45:
-        score += 2; reasons.append("Age ≥ 45 (+2)")
-    if bmi >= 30:
-        score += 3; reasons.append("BMI ≥ 30 (+3)")
-    elif bmi >= 25:
-        score += 1; reasons.append("BMI 25–29.9 (+1)")
+        d_score += 2; d_fired |= 1 << 0
+    if bmi_tier == 2:
+        d_score += 3; d_fired |= 1 << 1
+    elif bmi_tier == 1:
+        d_score += 1; d_fired |= 1 << 2
 
     if fasting_glucose >= 126:
-        score += 5; reasons.append("Fasting glucose ≥ 126 mg/dL (+5)")
+        d_score += 5; d_fired |= 1 << 3
     elif fasting_glucose >= 100:
-        score += 3; reasons.append("Fasting glucose 100–125 mg/dL (+3)")
+        d_score += 3; d_fired |= 1 << 4
 
-    if activity == "low":
-        score += 2; reasons.append("Low activity (+2)")
-    elif activity == "medium":
-        score += 1; reasons.append("Moderate activity (+1)")
+    if activity_code == 0:
+        d_score += 2; d_fired |= 1 << 5
+    elif activity_code == 1:
+        d_score += 1; d_fired |= 1 << 6
 
     if fam_diabetes:
-        score += 2; reasons.append("Family history of diabetes (+2)")
-
-    category = "High" if score >= 7 else "Moderate" if score >= 4 else "Low"
-    return category, score, reasons
-
-def score_hypertension(age, systolic, diastolic, bmi, smoker):
-    score, reasons = 0, []
+        d_score += 2; d_fired |= 1 << 7
 
+    # Hypertension
+    h_score, h_fired = 0, 0
     if systolic >= 160 or diastolic >= 100:
-        score += 5; reasons.append("Stage 2 BP (≥160/≥100) (+5)")
-    elif systolic >= 140 or diastolic >= 90:
-        score += 3; reasons.append("Stage 1 BP (≥140/≥90) (+3)")
-    elif systolic >= 130 or diastolic >= 80:
-        score += 2; reasons.append("Elevated BP (≥130/≥80) (+2)")
+        h_score += 5; h_fired |= 1 << 0
+    elif sys_tier == 2 or diastolic >= 90:
+        h_score += 3; h_fired |= 1 << 1
+    elif sys_tier == 1 or diastolic >= 80:
+        h_score += 2; h_fired |= 1 << 2
 
     if age >= 55:
-        score += 2; reasons.append("Age ≥ 55 (+2)")
-    if bmi >= 30:
-        score += 2; reasons.append("BMI ≥ 30 (+2)")
-    elif bmi >= 25:
-        score += 1; reasons.append("BMI 25–29.9 (+1)")
+        h_score += 2; h_fired |= 1 << 3
+    if bmi_tier == 2:
+        h_score += 2; h_fired |= 1 << 4
+    elif bmi_tier == 1:
+        h_score += 1; h_fired |= 1 << 5
     if smoker:
-        score += 2; reasons.append("Smoker (+2)")
-
-    category = "High" if score >= 7 else "Moderate" if score >= 4 else "Low"
-    return category, score, reasons
+        h_score += 2; h_fired |= 1 << 6
 
-def score_heart(age, gender, cholesterol, smoker, diabetes_cat, systolic):
-    score, reasons = 0, []
-
-    if (gender == "male" and age >= 45) or (gender == "female" and age >= 55):
-        score += 2; reasons.append("Age threshold (+2)")
+    # Heart (uses the diabetes category computed above)
+    c_score, c_fired = 0, 0
+    if (gender_code == 0 and age >= 45) or (gender_code == 1 and age >= 55):
+        c_score += 2; c_fired |= 1 << 0
 
     if cholesterol >= 240:
-        score += 3; reasons.append("Total cholesterol ≥ 240 (+3)")
+        c_score += 3; c_fired |= 1 << 1
     elif cholesterol >= 200:
-        score += 2; reasons.append("Total cholesterol 200–239 (+2)")
+        c_score += 2; c_fired |= 1 << 2
 
     if smoker:
-        score += 2; reasons.append("Smoker (+2)")
+        c_score += 2; c_fired |= 1 << 3
+
+    d_code = _category_code(d_score)
+    if d_code == 2:
+        c_score += 2; c_fired |= 1 << 4
+    elif d_code == 1:
+        c_score += 1; c_fired |= 1 << 5
+
+    if sys_tier == 2:
+        c_score += 2; c_fired |= 1 << 6
+    elif sys_tier == 1:
+        c_score += 1; c_fired |= 1 << 7
 
-    if diabetes_cat == "High":
-        score += 2; reasons.append("High diabetes risk (+2)")
-    elif diabetes_cat == "Moderate":
-        score += 1; reasons.append("Moderate diabetes risk (+1)")
+    return d_score, d_fired, h_score, h_fired, c_score, c_fired
 
-    if systolic >= 140:
-        score += 2; reasons.append("Systolic BP ≥ 140 (+2)")
-    elif systolic >= 130:
-        score += 1; reasons.append("Systolic BP 130–139 (+1)")
+def _reasons(table, fired):
+    return tuple(reason for i, reason in enumerate(table) if fired >> i & 1)
 
-    category = "High" if score >= 7 else "Moderate" if score >= 4 else "Low"
-    return category, score, reasons
+def _risk(score, fired, table):
+    return CATEGORIES[_category_code(score)], score, _reasons(table, fired)
+
+@lru_cache(maxsize=1024)
+def score_risks(gender, age, bmi, systolic, diastolic, fasting_glucose,
+                cholesterol, smoker, activity, fam_diabetes):
+    """Score diabetes, hypertension and heart risk in one kernel call.
+
+    Returns three (category, score, reasons) tuples in that order; results
+    are cached, so everything returned is immutable.
+    """
+    d_score, d_fired, h_score, h_fired, c_score, c_fired = _score_core(
+        GENDER_CODES.get(gender, -1), age, bmi, systolic, diastolic, fasting_glucose,
+        cholesterol, bool(smoker), ACTIVITY_CODES.get(activity, 2), bool(fam_diabetes))
+    return (
+        _risk(d_score, d_fired, DIABETES_REASONS),
+        _risk(h_score, h_fired, HYPERTENSION_REASONS),
+        _risk(c_score, c_fired, HEART_REASONS),
+    )
+
+GUIDANCE_INTRO = (
+    "Based on your details (Age {age}, BMI {bmi}, BP {systolic}/{diastolic} mmHg, "
+    "Fasting Glucose {fasting_glucose} mg/dL, Cholesterol {cholesterol} mg/dL), "
+    "here’s a quick health check:"
+)
+GUIDANCE_DISCLAIMER = "⚠️ This tool is educational and not a diagnosis. For symptoms or concerns, see a licensed clinician."
+GUIDANCE_NO_TIPS = "Keep up the great work! Maintain regular activity and balanced meals."
+
+# (condition key in result, line shown when that risk is not Low)
+GUIDANCE_RISK_LINES = (
+    ("diabetes", "• You may be at risk for **diabetes**. Consider checking HbA1c and fasting glucose with a clinician."),
+    ("hypertension", "• Your blood pressure profile suggests a **hypertension** risk. Home BP monitoring for 2–3 weeks is helpful."),
+    ("heart", "• Cardiovascular risk is elevated. Discuss a lipid profile and lifestyle plan with your clinician."),
+)
+
+# Tailored suggestions, one axis per input band; index 0 of each axis is
+# "no tip". Every combination of bands is rendered once into TIP_TABLE,
+# keyed by _tips_key() which packs each band into 2 bits.
+TIP_AXES = (
+    # BMI: 18.5–29.9, < 18.5, ≥ 30
+    (None,
+     "Your BMI is low — ensure adequate calories and protein; consider a nutrition consult.",
+     "Aim for gradual weight loss (5–7% in 3–6 months)."),
+    # Fasting glucose: < 100, 100–125, ≥ 126
+    (None,
+     "Fasting glucose is elevated — reduce refined sugar and increase fiber.",
+     "Fasting glucose is in diabetic range — seek medical evaluation soon."),
+    # BP: normal, ≥ 140/≥ 90
+    (None,
+     "Lower salt intake, manage stress, and check BP at home 3–4 days/week."),
+    # Cholesterol: < 200, 200–239, ≥ 240
+    (None,
+     "Borderline cholesterol — focus on unsaturated fats and regular exercise.",
+     "Cholesterol is high — consider a lipid panel and Mediterranean-style diet."),
+    # Smoker
+    (None,
+     "Smoking cessation gives the biggest health win — consider a cessation plan."),
+    # Low activity
+    (None,
+     "Start with 30 minutes of brisk walking at least 5 days/week."),
+)
+
+def _build_tip_table():
+    table = {}
+    for bands in product(*(range(len(axis)) for axis in TIP_AXES)):
+        tips = [axis[band] for axis, band in zip(TIP_AXES, bands) if band] or [GUIDANCE_NO_TIPS]
+        key = 0
+        for i, band in enumerate(bands):
+            key |= band << (2 * i)
+        table[key] = "**Care Tips:** " + " ".join(tips)
+    return table
+
+TIP_TABLE = _build_tip_table()
+
+def _tips_key(inputs):
+    bmi, glucose, cholesterol = inputs["bmi"], inputs["fasting_glucose"], inputs["cholesterol"]
+    return ((2 if bmi >= 30 else 1 if bmi < 18.5 else 0)
+            | (2 if glucose >= 126 else 1 if glucose >= 100 else 0) << 2
+            | (1 if inputs["systolic"] >= 140 or inputs["diastolic"] >= 90 else 0) << 4
+            | (2 if cholesterol >= 240 else 1 if cholesterol >= 200 else 0) << 6
+            | (1 if inputs["smoker"] else 0) << 8
+            | (1 if inputs["activity"] == "low" else 0) << 10)
+
+# Inputs the narrative depends on (cache key, together with the risk categories)
+GUIDANCE_KEYS = ("age", "bmi", "systolic", "diastolic", "fasting_glucose", "cholesterol", "smoker", "activity")
 
 def ai_guidance(inputs, res):
     """
     Unique feature: generate a patient-friendly summary with
     likely concerns + concrete actions, tailored to their numbers.
     """
-    gender = inputs["gender"]
-    age = inputs["age"]
-    bmi = inputs["bmi"]
-    systolic, diastolic = inputs["systolic"], inputs["diastolic"]
-    fasting_glucose = inputs["fasting_glucose"]
-    cholesterol = inputs["cholesterol"]
-    smoker = inputs["smoker"]
-    activity = inputs["activity"]
-
-    parts = []
-    parts.append(f"Based on your details (Age {age}, BMI {bmi}, BP {systolic}/{diastolic} mmHg, Fasting Glucose {fasting_glucose} mg/dL, Cholesterol {cholesterol} mg/dL), here’s a quick health check:")
-
-    if res["diabetes"]["category"] != "Low":
-        parts.append("• You may be at risk for **diabetes**. Consider checking HbA1c and fasting glucose with a clinician.")
-    if res["hypertension"]["category"] != "Low":
-        parts.append("• Your blood pressure profile suggests a **hypertension** risk. Home BP monitoring for 2–3 weeks is helpful.")
-    if res["heart"]["category"] != "Low":
-        parts.append("• Cardiovascular risk is elevated. Discuss a lipid profile and lifestyle plan with your clinician.")
-
-    # Tailored suggestions
-    tips = []
-    # BMI-based
-    if bmi >= 30:
-        tips.append("Aim for gradual weight loss (5–7% in 3–6 months).")
-    elif bmi < 18.5:
-        tips.append("Your BMI is low — ensure adequate calories and protein; consider a nutrition consult.")
-
-    # Glucose-based
-    if fasting_glucose >= 126:
-        tips.append("Fasting glucose is in diabetic range — seek medical evaluation soon.")
-    elif fasting_glucose >= 100:
-        tips.append("Fasting glucose is elevated — reduce refined sugar and increase fiber.")
-
-    # BP-based
-    if systolic >= 140 or diastolic >= 90:
-        tips.append("Lower salt intake, manage stress, and check BP at home 3–4 days/week.")
-
-    # Lipids
-    if cholesterol >= 240:
-        tips.append("Cholesterol is high — consider a lipid panel and Mediterranean-style diet.")
-    elif cholesterol >= 200:
-        tips.append("Borderline cholesterol — focus on unsaturated fats and regular exercise.")
-
-    # Lifestyle
-    if smoker:
-        tips.append("Smoking cessation gives the biggest health win — consider a cessation plan.")
-    if activity == "low":
-        tips.append("Start with 30 minutes of brisk walking at least 5 days/week.")
-
-    if not tips:
-        tips.append("Keep up the great work! Maintain regular activity and balanced meals.")
-
-    parts.append("**Care Tips:** " + " ".join(tips))
-    parts.append("⚠️ This tool is educational and not a diagnosis. For symptoms or concerns, see a licensed clinician.")
-
-    return "\n".join(parts)
+    return _guidance(
+        tuple(inputs[k] for k in GUIDANCE_KEYS),
+        tuple(res[key]["category"] for key, _ in GUIDANCE_RISK_LINES),
+    )
+
+@lru_cache(maxsize=1024)
+def _guidance(values, categories):
+    inputs = dict(zip(GUIDANCE_KEYS, values))
+    risk_lines = [line for (_, line), cat in zip(GUIDANCE_RISK_LINES, categories) if cat != "Low"]
+
+    return "\n".join((
+        GUIDANCE_INTRO.format_map(inputs),
+        *risk_lines,
+        TIP_TABLE[_tips_key(inputs)],
+        GUIDANCE_DISCLAIMER,
+    ))
 
 # ----------------------------------------------------
 # Routes
@@ -252,20 +551,13 @@ def signup():
             flash("Please fill both username and password.", "danger")
             return render_template("signup.html")
 
-        with get_db() as conn:
-            cur = conn.cursor()
-            # Duplicate check (no redirect if duplicate)
-            cur.execute("SELECT id FROM users WHERE username=?", (username,))
-            exists = cur.fetchone()
-            if exists:
-                flash("⚠️ Username already exists. Try logging in.", "warning")
-                return render_template("signup.html")
-            # Create user
-            cur.execute(
-                "INSERT INTO users(username, password_hash) VALUES(?, ?)",
-                (username, generate_password_hash(password))
-            )
-            conn.commit()
+        cur = get_db().cursor()
+        # Create user; UNIQUE(username) turns a duplicate into a no-op
+        cur.execute(INSERT_USER_SQL, (username, generate_password_hash(password, method=PW_METHOD)))
+        # Duplicate check (no redirect if duplicate)
+        if cur.rowcount == 0:
+            flash("⚠️ Username already exists. Try logging in.", "warning")
+            return render_template("signup.html")
 
         flash("✅ Account created! Please login.", "success")
         return redirect(url_for("login"))
@@ -278,10 +570,9 @@ def login():
         username = (request.form.get("username") or "").strip()
         password = (request.form.get("password") or "").strip()
 
-        with get_db() as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT id, username, password_hash FROM users WHERE username=?", (username,))
-            user = cur.fetchone()
+        cur = get_db().cursor()
+        cur.execute(SELECT_USER_SQL, (username,))
+        user = cur.fetchone()
 
         if user and check_password_hash(user["password_hash"], password):
             session["user_id"] = user["id"]
@@ -295,6 +586,52 @@ def logout():
     session.clear()
     return redirect(url_for("index"))
 
+def _predict(form, user_id):
+    """Score a submitted form, queue it for history and return (result, narrative)."""
+    # Read inputs safely
+    gender = form.get("gender", "male")
+    age = s_int(form.get("age"))
+    height_cm = s_float(form.get("height_cm"))
+    weight_kg = s_float(form.get("weight_kg"))
+    systolic = s_int(form.get("systolic"))
+    diastolic = s_int(form.get("diastolic"))
+    fasting_glucose = s_int(form.get("fasting_glucose"))
+    cholesterol = s_int(form.get("cholesterol"))
+    smoker = (form.get("smoker") == "yes")
+    activity = form.get("activity", "low")
+    fam_diabetes = (form.get("fam_diabetes") == "yes")
+
+    bmi = compute_bmi(height_cm, weight_kg)
+
+    # Score
+    (d_cat, d_score, d_reasons), (h_cat, h_score, h_reasons), (c_cat, c_score, c_reasons) = score_risks(
+        gender, age, bmi, systolic, diastolic, fasting_glucose,
+        cholesterol, smoker, activity, fam_diabetes)
+
+    # Result object for template / JSON
+    result = {
+        "bmi": bmi,
+        "diabetes": {"category": d_cat, "score": d_score, "reasons": d_reasons},
+        "hypertension": {"category": h_cat, "score": h_score, "reasons": h_reasons},
+        "heart": {"category": c_cat, "score": c_score, "reasons": c_reasons},
+        "tips": []  # tips are embedded into narrative below to avoid duplication
+    }
+
+    inputs = {
+        "gender": gender, "age": age, "height_cm": height_cm, "weight_kg": weight_kg,
+        "bmi": bmi, "systolic": systolic, "diastolic": diastolic,
+        "fasting_glucose": fasting_glucose, "cholesterol": cholesterol,
+        "smoker": smoker, "activity": activity, "fam_diabetes": fam_diabetes
+    }
+
+    # AI-like narrative suggestions
+    narrative = ai_guidance(inputs, result)
+
+    # Save to DB (batched and committed by the history writer thread)
+    history_q.put((user_id, *(inputs[k] for k in INPUT_NAMES), d_cat, h_cat, c_cat, narrative))
+
+    return result, narrative
+
 @app.route("/dashboard", methods=["GET", "POST"])
 def dashboard():
     if "user_id" not in session:
@@ -303,86 +640,58 @@ def dashboard():
     result = None
     narrative = None
 
+    # The page normally posts to /predict via fetch; this is the no-JS fallback
     if request.method == "POST":
-        # Read inputs safely
-        gender = request.form.get("gender", "male")
-        age = s_int(request.form.get("age"))
-        height_cm = s_float(request.form.get("height_cm"))
-        weight_kg = s_float(request.form.get("weight_kg"))
-        systolic = s_int(request.form.get("systolic"))
-        diastolic = s_int(request.form.get("diastolic"))
-        fasting_glucose = s_int(request.form.get("fasting_glucose"))
-        cholesterol = s_int(request.form.get("cholesterol"))
-        smoker = (request.form.get("smoker") == "yes")
-        activity = request.form.get("activity", "low")
-        fam_diabetes = (request.form.get("fam_diabetes") == "yes")
-
-        bmi = compute_bmi(height_cm, weight_kg)
-
-        # Score
-        d_cat, d_score, d_reasons = score_diabetes(age, bmi, fasting_glucose, activity, fam_diabetes)
-        h_cat, h_score, h_reasons = score_hypertension(age, systolic, diastolic, bmi, smoker)
-        c_cat, c_score, c_reasons = score_heart(age, gender, cholesterol, smoker, d_cat, systolic)
-
-        # Result object for template
-        result = {
-            "bmi": bmi,
-            "diabetes": {"category": d_cat, "score": d_score, "reasons": d_reasons},
-            "hypertension": {"category": h_cat, "score": h_score, "reasons": h_reasons},
-            "heart": {"category": c_cat, "score": c_score, "reasons": c_reasons},
-            "tips": []  # tips are embedded into narrative below to avoid duplication
-        }
-
-        inputs = {
-            "gender": gender, "age": age, "height_cm": height_cm, "weight_kg": weight_kg,
-            "bmi": bmi, "systolic": systolic, "diastolic": diastolic,
-            "fasting_glucose": fasting_glucose, "cholesterol": cholesterol,
-            "smoker": smoker, "activity": activity, "fam_diabetes": fam_diabetes
-        }
-
-        # AI-like narrative suggestions
-        narrative = ai_guidance(inputs, result)
-
-        # Save to DB
-        with get_db() as conn:
-            conn.execute("""
-                INSERT INTO history(user_id, inputs_json, diabetes_risk, hypertension_risk, heart_risk, narrative)
-                VALUES(?, ?, ?, ?, ?, ?)
-            """, (session["user_id"], json.dumps(inputs), d_cat, h_cat, c_cat, narrative))
-            conn.commit()
+        result, narrative = _predict(request.form, session["user_id"])
 
     return render_template("dashboard.html", result=result, narrative=narrative)
 
+@app.post("/predict")
+def predict():
+    if "user_id" not in session:
+        return jsonify(error="login required"), 401
+
+    result, narrative = _predict(request.form, session["user_id"])
+    return jsonify(result=result, narrative=narrative)
+
 @app.route("/history")
 def history():
     if "user_id" not in session:
         return redirect(url_for("login"))
 
-    with get_db() as conn:
-        rows = conn.execute("""
-            SELECT id, inputs_json, diabetes_risk, hypertension_risk, heart_risk, created_at, narrative
-            FROM history
-            WHERE user_id=?
-            ORDER BY created_at DESC
-        """, (session["user_id"],)).fetchall()
-
-    records = []
-    for r in rows:
-        try:
-            inputs = json.loads(r["inputs_json"]) if r["inputs_json"] else {}
-        except:
-            inputs = {}
-        records.append({
-            "id": r["id"],
-            "created_at": r["created_at"],
-            "diabetes": r["diabetes_risk"],
-            "hypertension": r["hypertension_risk"],
-            "heart": r["heart_risk"],
-            "inputs": inputs,
-            "narrative": r["narrative"] or ""
-        })
-
-    return render_template("history.html", records=records)
+    # Clamp so the OFFSET always fits in SQLite INTEGER; errors inside the
+    # streamed response would cut the page off after a 200
+    page = min(max(request.args.get("page", 1, type=int), 1), HISTORY_MAX_PAGE)
+    user_id = session["user_id"]
+    # has_next is only known once the rows have been read; the template
+    # checks it after the loop
+    pager = {"page": page, "has_next": False}
+
+    def iter_records():
+        # Fetch one extra row to know whether a next page exists
+        cur = get_db().execute(
+            SELECT_HISTORY_PAGE_SQL, (user_id, HISTORY_PAGE_SIZE + 1, (page - 1) * HISTORY_PAGE_SIZE))
+        for n, r in enumerate(cur):
+            if n == HISTORY_PAGE_SIZE:
+                pager["has_next"] = True
+                break
+            yield {
+                "id": r["id"],
+                "created_at": r["created_at"],
+                "diabetes": r["diabetes_risk"],
+                "hypertension": r["hypertension_risk"],
+                "heart": r["heart_risk"],
+                "inputs": {k: r[k] for k in INPUT_NAMES if r[k] is not None},
+                "narrative": r["narrative"] or ""
+            }
+
+    # The streamed body renders after the session cookie has been saved, so
+    # base.html must not modify the session. Pop the flashes now; the
+    # template's get_flashed_messages() then reads the per-request cache.
+    get_flashed_messages(with_categories=True)
+
+    # Rows are rendered and sent as the cursor yields them
+    return stream_template("history.html", records=iter_records(), pager=pager)
 
 # ----------------------------------------------------
 # Run
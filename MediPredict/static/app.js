@@ -0,0 +1,76 @@
+// Dashboard: send the form to /predict and redraw only the results card.
+// Without JS (or if /predict fails) the form posts to /dashboard as usual.
+(function () {
+  const form = document.getElementById("pred-form");
+  const panel = document.getElementById("results");
+  if (!form || !panel) return;
+
+  const CONDITIONS = [
+    ["diabetes", "Diabetes"],
+    ["hypertension", "Hypertension"],
+    ["heart", "Heart Disease"],
+  ];
+
+  function el(tag, className, text) {
+    const node = document.createElement(tag);
+    if (className) node.className = className;
+    if (text !== undefined) node.textContent = text;
+    return node;
+  }
+
+  function pill(label, value, className, suffix) {
+    const node = el("span", className);
+    node.append(label + ": ", el("b", null, String(value)));
+    if (suffix) node.append(" " + suffix);
+    return node;
+  }
+
+  function render(data) {
+    const result = data.result;
+
+    const pills = el("div", "pill-row");
+    pills.append(pill("BMI", Number(result.bmi).toFixed(1), "pill"));  // same "22.0" as the server view
+    const reasons = el("div", "reasons");
+
+    for (const [key, label] of CONDITIONS) {
+      const risk = result[key];
+      pills.append(pill(label, risk.category, "pill " + risk.category.toLowerCase(), "(" + risk.score + ")"));
+
+      const list = el("ul");
+      for (const reason of risk.reasons) list.append(el("li", null, reason));
+      const col = el("div");
+      col.append(el("h4", null, label), list);
+      reasons.append(col);
+    }
+
+    panel.replaceChildren(
+      pills,
+      el("h3", null, "Why we think so"),
+      reasons,
+      el("h3", null, "AI Guidance"),
+      el("pre", "narrative", data.narrative),
+    );
+  }
+
+  form.addEventListener("submit", async function (event) {
+    event.preventDefault();
+    let resp;
+    try {
+      resp = await fetch(form.dataset.predictUrl, {
+        method: "POST",
+        body: new FormData(form),
+        headers: { "Accept": "application/json" },
+      });
+    } catch (err) {
+      resp = null;  // network failure: the prediction never reached the server
+    }
+    // Only fall back to a full-page POST to /dashboard when /predict did not
+    // succeed; after a 2xx the prediction is already saved, so resubmitting
+    // would record it twice
+    if (!resp || !resp.ok) {
+      form.submit();
+      return;
+    }
+    render(await resp.json());
+  });
+})();